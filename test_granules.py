@@ -1,22 +1,96 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 import json
+import logging
 import subprocess
+import sys
 import os
+import shutil
+import shlex
+import socket
 import time
 import re
-from urllib.parse import urlparse
 import argparse
-
-CMR_GRANULES_URL = "https://cmr.earthdata.nasa.gov/search/granules.json"
-CMR_COLLECTIONS_URL = "https://cmr.earthdata.nasa.gov/search/collections.json"
+import codecs
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Use orjson to parse the CMR responses when it is installed; it is faster and takes
+# the response bytes directly. orjson.JSONDecodeError subclasses json.JSONDecodeError.
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Drive Docker through the Python SDK when it is installed, which talks to the daemon
+# socket directly; otherwise fall back to running the docker CLI.
+try:
+    import docker
+except ImportError:
+    docker = None
+
+CMR_HOST = "cmr.earthdata.nasa.gov"
+CMR_GRANULES_URL = f"https://{CMR_HOST}/search/granules.json"
+CMR_COLLECTIONS_URL = f"https://{CMR_HOST}/search/collections.json"
 # COLLECTION_DOI is default, can be overridden by command line argument -d
 COLLECTION_DOI = "10.5067/MODIS/MCD12Q1.061"
 DATA_DIR = os.path.join(os.getcwd(), "hyrax_data")
 HYRAX_CONTAINER_NAME = "hyrax"
 HYRAX_IMAGE = "opendap/hyrax:1.17.1-126"
 HYRAX_PORT = 8080
+HYRAX_DATA_MOUNT = "/usr/share/hyrax"
+verbose: bool = False  # Set by -v/--verbose in main()
+# On-disk cache of DOI -> collection concept ID lookups; each entry is reused until it is CACHE_MAX_AGE seconds old
+CONCEPT_ID_CACHE = pathlib.Path.home() / ".cache" / "pydmr-test" / "doi_concept.json"
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+# Granule link relations that are preferred when choosing an HDF download URL
+PRIORITY_RELS = frozenset({
+    "http://esip.opendap.org/ns/esip/data",
+    "http://esip.opendap.org/ns/esip/producer",
+    "http://esip.opendap.org/ns/esip/download"
+})
+# HTTP(S) URLs, group 1 is 's' for HTTPS; and an HDF file name, possibly followed by a query or fragment
+_HTTP_RE = re.compile(r'^http(s?)://', re.IGNORECASE)
+_HDF_RE = re.compile(r'\.hdf(?:$|[?#])', re.IGNORECASE)
+# (connect, read) timeouts in seconds: a dead host fails fast, a slow response is still allowed to finish
+REQUEST_TIMEOUT = (3.05, 30)
+DOWNLOAD_TIMEOUT = (3.05, 300)
+# Block size used when streaming granule downloads to disk
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# One Session for every CMR and Hyrax request so that keep-alive connections
+# are pooled and reused instead of paying a new TCP/TLS handshake per call.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                       max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+def warm_dns(host, port=443):
+    """
+    Resolves a host name so a caching resolver has the answer ready before the first
+    connection needs it. Failures are ignored; the real request will report them.
+    :param host: The host name to resolve.
+    :param port: The port that will be used to connect.
+    """
+    try:
+        socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except OSError:
+        pass
+
+def _echo_lines(stream, destination, lines):
+    """
+    Copies each line read from 'stream' to 'destination' as it arrives, and to 'lines'.
+    """
+    for line in stream:
+        print(line, end="", file=destination, flush=True)
+        lines.append(line)
 
 def run_command(command, check_success=True, capture_output=False, shell=False):
     """
@@ -27,25 +101,31 @@ def run_command(command, check_success=True, capture_output=False, shell=False):
     :param shell: If True, executes the command through the shell.
     :return: CompletedProcess object if capture_output is True, otherwise None.
     """
-    print(f"Executing command: {' '.join(command) if isinstance(command, list) else command}")
+    if verbose:
+        print(f"Executing command: {' '.join(command) if isinstance(command, list) else command}")
     try:
-        result = subprocess.run(
-            command,
-            check=check_success,
-            capture_output=capture_output,
-            text=True, # Decode stdout/stderr as text
-            shell=shell
-        )
-        if capture_output:
+        if not capture_output:
+            # stdout/stderr are inherited, so the output goes straight to the terminal
+            return subprocess.run(command, check=check_success, text=True, shell=shell)
+
+        # Echo stdout and stderr line by line as the command runs instead of waiting for it
+        # to finish. stderr is echoed by a second thread so neither pipe can fill and block.
+        # The text is still kept because it is returned to the caller (exec_in_hyrax() looks
+        # for gen_dmrpp_side_car failure markers in it).
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True, shell=shell) as process:
+            stderr_lines = []
+            stderr_reader = threading.Thread(target=_echo_lines, args=(process.stderr, sys.stderr, stderr_lines))
+            stderr_reader.start()
             print("--- Command Output ---")
-            print(result.stdout)
-            if result.stderr:
-                print("--- Command Error Output ---")
-                print("--- Start Command Error ---")
-                print(result.stderr)
-                print("--- End Command Error ---")
-            print("----------------------")
-        return result
+            stdout_lines = []
+            _echo_lines(process.stdout, sys.stdout, stdout_lines)
+            stderr_reader.join()
+            returncode = process.wait()
+
+        stdout, stderr = "".join(stdout_lines), "".join(stderr_lines)
+        del stdout_lines, stderr_lines
+        print("----------------------")
     except subprocess.CalledProcessError as e:
         print(f"Error: Command failed with exit code {e.returncode}")
         print(f"STDOUT: {e.stdout}")
@@ -58,12 +138,61 @@ def run_command(command, check_success=True, capture_output=False, shell=False):
         print(f"An unexpected error occurred: {e}")
         raise
 
-def get_collection_concept_id(doi):
+    # Raised outside the try so the handler above does not print the output a second time;
+    # it has already been echoed while the command ran.
+    if check_success and returncode != 0:
+        print(f"Error: Command failed with exit code {returncode}")
+        raise subprocess.CalledProcessError(returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+def read_concept_id_cache():
+    """
+    Reads the DOI to concept ID cache. Each entry records when it was fetched and
+    expires on its own once it is CACHE_MAX_AGE seconds old.
+    :return: The unexpired entries, {doi: {"id": concept_id, "time": fetch_time}}; empty
+    if the cache is missing, unreadable or malformed.
+    """
+    try:
+        with open(CONCEPT_ID_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+
+    now = time.time()
+    return {doi: entry for doi, entry in cache.items()
+            if isinstance(entry, dict) and isinstance(entry.get("time"), (int, float))
+            and now - entry["time"] < CACHE_MAX_AGE}
+
+def write_concept_id_cache(doi, concept_id):
+    """
+    Adds a DOI to concept ID mapping to the on-disk cache, dropping any expired entries.
+    :param doi: The DOI of the collection.
+    :param concept_id: The concept ID CMR returned for the DOI.
+    """
+    cache = read_concept_id_cache()
+    cache[doi] = {"id": concept_id, "time": time.time()}
+    try:
+        CONCEPT_ID_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        with open(CONCEPT_ID_CACHE, 'w') as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Warning: Could not write concept ID cache {CONCEPT_ID_CACHE}: {e}")
+
+def get_collection_concept_id(doi, use_cache=True):
     """
     Searches CMR for a collection's concept ID using its DOI.
     :param doi: The DOI of the collection.
+    :param use_cache: If True, use (and update) the on-disk DOI to concept ID cache.
     :return: The concept ID of the collection, or None if not found.
     """
+    if use_cache:
+        concept_id = read_concept_id_cache().get(doi, {}).get("id")
+        if concept_id:
+            print(f"\nFound cached Collection Concept ID for DOI {doi}: {concept_id}")
+            return concept_id
+
     params = {
         "doi": doi,
         "page_size": 1,
@@ -71,9 +200,9 @@ def get_collection_concept_id(doi):
     }
     print(f"\nSearching CMR for collection concept ID using DOI: {doi}")
     try:
-        response = requests.get(CMR_COLLECTIONS_URL, params=params)
+        response = SESSION.get(CMR_COLLECTIONS_URL, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
 
         entries = data.get("feed", {}).get("entry", [])
         if not entries:
@@ -83,6 +212,8 @@ def get_collection_concept_id(doi):
         collection_entry = entries[0]
         concept_id = collection_entry.get("id")
         print(f"Found Collection Concept ID: {concept_id}")
+        if use_cache and concept_id:
+            write_concept_id_cache(doi, concept_id)
         return concept_id
     except requests.exceptions.RequestException as e:
         print(f"Error searching CMR for collection: {e}")
@@ -108,9 +239,9 @@ def get_granule_info(collection_concept_id, sort_key):
     print(f"\nSearching CMR for granule with sort key: {sort_key} within collection {collection_concept_id}")
     try:
         # Raise an exception for bad status codes
-        response = requests.get(CMR_GRANULES_URL, params=params)
+        response = SESSION.get(CMR_GRANULES_URL, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = json_loads(response.content)
 
         entries = data.get("feed", {}).get("entry", [])
         if not entries:
@@ -122,30 +253,26 @@ def get_granule_info(collection_concept_id, sort_key):
         granule_id = granule_entry.get("id") # Granule Concept ID
 
         download_url = None
-        possible_urls = []
+        best_tier = None
 
+        # Rank the candidate HDF links, lower is better:
+        #   0 = HTTPS priority link, 1 = other HTTPS link, 2 = HTTP priority link, 3 = other HTTP link
+        # and keep the first link of the best tier seen, which needs only one pass over the links.
         for link in granule_entry.get("links", []):
             href = link.get("href", "")
             rel = link.get("rel", "")
 
-            # Prioritize 'data' or 'producer' links that point to HDF files
-            if (rel == "http://esip.opendap.org/ns/esip/data" or \
-                rel == "http://esip.opendap.org/ns/esip/producer" or \
-                rel == "http://esip.opendap.org/ns/esip/download") and \
-               (href.startswith("http://") or href.startswith("https://")) and \
-               href.lower().endswith(".hdf"):
-                possible_urls.insert(0, href)
-            elif (href.startswith("http://") or href.startswith("https://")) and \
-                 href.lower().endswith(".hdf"):
-                possible_urls.append(href) # Use other direct HDF links as a fallback
-
-        if possible_urls:
-            # Prefer HTTPS over HTTP if both are available
-            https_urls = [url for url in possible_urls if url.startswith("https://")]
-            if https_urls:
-                download_url = https_urls[0]
-            else:
-                download_url = possible_urls[0]
+            http_match = _HTTP_RE.match(href)
+            if not (http_match and _HDF_RE.search(href)):
+                continue
+
+            # Prefer HTTPS over HTTP, then 'data', 'producer' or 'download' links over other HDF links
+            tier = (0 if http_match.group(1) else 2) + (0 if rel in PRIORITY_RELS else 1)
+            if best_tier is None or tier < best_tier:
+                best_tier = tier
+                download_url = href
+                if best_tier == 0:
+                    break # An HTTPS priority link is the best possible choice
 
         if not download_url:
             print(f"Warning: No suitable HTTP/HTTPS HDF download URL found for granule: {title}")
@@ -169,20 +296,80 @@ def get_granule_info(collection_concept_id, sort_key):
         print("Error: Could not decode JSON response from CMR.")
         return None
 
+def granule_filename_from_url(url):
+    """
+    Extracts the file name from a granule download URL.
+    The fragment and query string are removed first, since either may itself contain '/'.
+    :param url: The download URL.
+    :return: The last path segment of the URL.
+    """
+    return url.split('#', 1)[0].split('?', 1)[0].rsplit('/', 1)[-1]
+
+def get_remote_size(url):
+    """
+    Asks the server for the size of a file without downloading it.
+    :param url: The URL of the file.
+    :return: A tuple of the file's Content-Length, or -1 if it could not be determined, and
+    a validator for an If-Range header (its strong ETag, else its Last-Modified date), or None.
+    """
+    try:
+        head = SESSION.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+        head.raise_for_status()
+        etag = head.headers.get("ETag")
+        # If-Range only accepts a strong ETag
+        validator = etag if etag and not etag.startswith("W/") else head.headers.get("Last-Modified")
+        return int(head.headers.get("Content-Length", "-1")), validator
+    except (requests.exceptions.RequestException, ValueError):
+        return -1, None
+
 def download_file(url, destination_path):
     """
     Downloads a file from a given URL to a specified local path.
+    If a complete copy is already present the download is skipped, and a partial
+    copy (e.g., from an interrupted run) is resumed with an HTTP Range request. The
+    request carries If-Range, so a file that changed on the server is downloaded again
+    in full rather than appended to the old partial copy.
     :param url: The URL of the file to download.
     :param destination_path: The local path to save the file.
     :return: True if successful, False otherwise.
     """
+    existing_size = os.path.getsize(destination_path) if os.path.exists(destination_path) else 0
+    headers = {}
+    if existing_size > 0:
+        remote_size, validator = get_remote_size(url)
+        if remote_size == existing_size:
+            print(f"\n{destination_path} is already downloaded ({existing_size} bytes), skipping download.")
+            return True
+        # Without a validator there is no way to tell the partial copy is still current
+        if 0 < existing_size < remote_size and validator:
+            headers["Range"] = f"bytes={existing_size}-"
+            headers["If-Range"] = validator
+
     print(f"\nDownloading {url} to {destination_path}...")
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(destination_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        response = SESSION.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+        # Append only if the server sent exactly the missing bytes; a 200 means the whole
+        # file follows, and a 206 for some other range means starting over.
+        if response.status_code == 206 and \
+                not response.headers.get("Content-Range", "").startswith(f"bytes {existing_size}-"):
+            print(f"Unexpected Content-Range '{response.headers.get('Content-Range')}', downloading the whole file.")
+            response.close()
+            response = SESSION.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        with response:
+            response.raise_for_status()
+            if response.status_code == 206:
+                print(f"Resuming download at byte {existing_size}.")
+                mode = 'ab'
+            else:
+                mode = 'wb'
+            # Let urllib3 undo any Content-Encoding, then copy the raw stream to disk in
+            # 1 MiB blocks; copyfileobj keeps the loop out of Python-level per-chunk code.
+            # A zero-copy socket-to-file path (sendfile/splice) is deliberately not used:
+            # granule URLs are HTTPS, http.client may already hold part of the body in its
+            # read buffer, and chunked or encoded bodies must pass through urllib3.
+            response.raw.decode_content = True
+            with open(destination_path, mode, buffering=COPY_BUFFER_SIZE) as f:
+                shutil.copyfileobj(response.raw, f, length=COPY_BUFFER_SIZE)
         print("Download complete.")
         return True
     except requests.exceptions.RequestException as e:
@@ -191,6 +378,12 @@ def download_file(url, destination_path):
         print("NOTE: The 502 Bad Gateway error during download often means Earthdata Login authentication is required.")
         print("This script does not currently implement Earthdata Login for protected data.")
         return False
+    except urllib3.exceptions.HTTPError as e:
+        # Reading response.raw directly bypasses requests' exception wrapping, so a dropped
+        # connection or read timeout mid-body surfaces as a urllib3 error. Any partial file
+        # is left in place and resumed on the next run.
+        print(f"Error downloading file: {e}")
+        return False
     except IOError as e:
         print(f"Error saving file to disk: {e}")
         return False
@@ -201,9 +394,7 @@ def test_dmrpp(granule_filename):
     Follows Section 4 of the DMR++ testing instructions.
     :param granule_filename: The base filename of the HDF granule.
     """
-    print("\n\t|--------------------------------------------------------------------------------------|"
-          f"\n\t|--- Testing DMR++ for {granule_filename} ---|"
-          "\n\t|--------------------------------------------------------------------------------------|")
+    logging.info("phase=test_dmrpp granule=%s", granule_filename)
     # OPeNDAP path now includes the full HDF filename before extensions
     base_opendap_path_with_hdf = f"http://localhost:{HYRAX_PORT}/opendap/{granule_filename}"
 
@@ -220,16 +411,192 @@ def test_dmrpp(granule_filename):
 
     for name, url in test_urls.items():
         print(f"Checking {name} URL: {url}")
+
+    # The four GETs are independent, so issue them concurrently. The urllib3 pool
+    # behind SESSION is thread-safe; results are printed here, in the main thread,
+    # as each request completes so the output is not interleaved.
+    with ThreadPoolExecutor(max_workers=len(test_urls)) as executor:
+        futures = {executor.submit(SESSION.get, url, timeout=REQUEST_TIMEOUT): name for name, url in test_urls.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                response = future.result()
+                response.raise_for_status()
+                print(f"  {name} check: SUCCESS (Status: {response.status_code})")
+                if "HTML" in name:
+                    print("  Successfully retrieved HTML page.")
+            except requests.exceptions.RequestException as e:
+                print(f"  {name} check: FAILED - {e}")
+            except Exception as e:
+                print(f"  An unexpected error occurred during {name} check: {e}")
+
+def wait_for_hyrax():
+    """
+    Polls the Hyrax server, with exponential backoff, until it answers requests.
+    There are seven attempts with about 16 seconds of sleep between them in total; each
+    attempt can add up to 2 seconds more if the connection hangs rather than being refused.
+    :return: True if Hyrax responded, False otherwise.
+    """
+    # Poll with a plain Session: SESSION's retrying adapter would turn each attempt
+    # into several connects plus its own backoff.
+    with requests.Session() as poll_session:
+        for delay in (0.25, 0.5, 1, 2, 4, 8, None):
+            try:
+                response = poll_session.head(f"http://localhost:{HYRAX_PORT}/opendap/", timeout=2)
+                response.raise_for_status()
+                return True
+            except requests.exceptions.RequestException:
+                if delay is None:
+                    break # No point sleeping after the final attempt
+                time.sleep(delay)
+    return False
+
+_docker_client = None
+_docker_client_failed = False
+
+def get_docker_client():
+    """
+    Creates a Docker SDK client for the local daemon on first use.
+    :return: The client, or None if the SDK is not installed or cannot reach the daemon,
+    in which case callers fall back to the docker CLI.
+    """
+    global _docker_client, _docker_client_failed
+    if docker is None or _docker_client_failed:
+        return None
+    if _docker_client is None:
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            print(f"  {name} check: SUCCESS (Status: {response.status_code})")
-            if "HTML" in name:
-                print("  Successfully retrieved HTML page.")
-        except requests.exceptions.RequestException as e:
-            print(f"  {name} check: FAILED - {e}")
+            _docker_client = docker.from_env()
+        except docker.errors.DockerException as e:
+            print(f"Warning: Docker SDK unavailable ({e}), using the docker CLI instead.")
+            _docker_client_failed = True
+            return None
+    return _docker_client
+
+def remove_hyrax_container():
+    """
+    Removes the Hyrax container, if there is one. Failures are reported but not raised.
+    """
+    client = get_docker_client()
+    if client is None:
+        run_command(["docker", "rm", "-f", HYRAX_CONTAINER_NAME], check_success=False)
+        return
+    try:
+        client.containers.get(HYRAX_CONTAINER_NAME).remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    except docker.errors.DockerException as e:
+        print(f"Error removing container {HYRAX_CONTAINER_NAME}: {e}")
+
+def start_hyrax_container(data_dir):
+    """
+    Starts a new Hyrax container with the local data directory mounted as its data root.
+    On macOS, Docker Desktop shares bind mounts through a file sharing layer; 'cached'
+    relaxes consistency to speed up Hyrax's reads. On Linux a bind mount is already
+    native filesystem access.
+    :param data_dir: The local directory holding the HDF files.
+    """
+    cached = sys.platform == "darwin"
+    client = get_docker_client()
+    if client is None:
+        run_command([
+            "docker", "run", "-d",
+            "-h", HYRAX_CONTAINER_NAME,
+            "-p", f"{HYRAX_PORT}:8080",
+            "-v", f"{data_dir}:{HYRAX_DATA_MOUNT}{':cached' if cached else ''}",
+            "--name", HYRAX_CONTAINER_NAME,
+            HYRAX_IMAGE
+        ])
+        return
+    client.containers.run(
+        HYRAX_IMAGE, detach=True,
+        hostname=HYRAX_CONTAINER_NAME, name=HYRAX_CONTAINER_NAME,
+        ports={"8080/tcp": HYRAX_PORT},
+        volumes={data_dir: {"bind": HYRAX_DATA_MOUNT, "mode": "rw,cached" if cached else "rw"}})
+
+def exec_in_hyrax(command):
+    """
+    Runs a command inside the Hyrax container, in the mounted data directory.
+    The command's output is echoed as it is produced.
+    :param command: List of strings for the command and its arguments.
+    :return: The command's output.
+    :raises subprocess.CalledProcessError: If the command returns a non-zero exit code;
+    its 'output' holds what the command printed.
+    """
+    client = get_docker_client()
+    if client is None:
+        result = run_command(["docker", "exec", "-w", HYRAX_DATA_MOUNT, HYRAX_CONTAINER_NAME] + command,
+                             capture_output=True)
+        return result.stdout
+    if verbose:
+        print(f"Executing in {HYRAX_CONTAINER_NAME}: {' '.join(command)}")
+    # Use the low-level API so the output can be streamed and the exit code still read
+    exec_id = client.api.exec_create(HYRAX_CONTAINER_NAME, command, workdir=HYRAX_DATA_MOUNT)["Id"]
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    output = []
+    for chunk in client.api.exec_start(exec_id, stream=True):
+        output.append(decoder.decode(chunk))
+        print(output[-1], end="", flush=True)
+    output.append(decoder.decode(b"", final=True))
+    print(output[-1], end="")
+    output = "".join(output)
+    exit_code = client.api.exec_inspect(exec_id)["ExitCode"]
+    if exit_code != 0:
+        raise subprocess.CalledProcessError(exit_code, command, output)
+    return output
+
+# Printed by the batched gen_dmrpp_side_car script, followed by the name of a granule that failed
+SIDECAR_FAILED_MARKER = "gen_dmrpp_side_car failed for:"
+SIDECAR_FAILED_FORMAT = "\\n%s %s\\n"  # printf format for the marker line
+
+def process_granules(granule_filenames, hyrax_ready=None):
+    """
+    Builds the DMR++ sidecars for downloaded granules and then tests them via Hyrax.
+    All the gen_dmrpp_side_car runs share one exec in the container so the container attach
+    cost is paid once per batch rather than once per granule. Granules whose sidecar could
+    not be built are not tested.
+    :param granule_filenames: The base filenames of the HDF granules in the data directory.
+    :param hyrax_ready: Optional future for wait_for_hyrax(); the probes wait for it first.
+    """
+    logging.info("phase=gen_dmrpp_side_car granules=%s", ",".join(granule_filenames))
+    # Run every granule even if an earlier one fails; each failure is reported on a line of
+    # its own (the leading newline ends any unterminated tool output) and recorded in the
+    # exit status.
+    # Filenames are relative to /usr/share/hyrax, which is the mounted directory.
+    script = "; ".join(["status=0"] +
+                       [f"gen_dmrpp_side_car -i {shlex.quote(fn)} -H -U || "
+                        f"{{ printf {shlex.quote(SIDECAR_FAILED_FORMAT)} {shlex.quote(SIDECAR_FAILED_MARKER)} "
+                        f"{shlex.quote(fn)}; status=1; }}"
+                        for fn in granule_filenames] +
+                       ["exit $status"])
+    try:
+        exec_in_hyrax(["sh", "-c", script])
+        print(f"Successfully ran gen_dmrpp_side_car for {', '.join(granule_filenames)}.")
+        failed = set()
+    except subprocess.CalledProcessError as e:
+        output = e.output or ""
+        failed = {line[len(SIDECAR_FAILED_MARKER):].strip() for line in output.splitlines()
+                  if line.startswith(SIDECAR_FAILED_MARKER)}
+        print(f"Failed to generate DMR++ sidecar for {', '.join(sorted(failed)) or 'one or more granules'} "
+              f"(exit status {e.returncode}).")
+        if not failed:
+            # The script did not get as far as reporting individual granules
+            failed = set(granule_filenames)
+    except Exception as e:
+        print(f"Failed to generate DMR++ sidecars for {', '.join(granule_filenames)}: {e}")
+        failed = set(granule_filenames)
+
+    if hyrax_ready is not None and any(fn not in failed for fn in granule_filenames):
+        if not hyrax_ready.result():
+            print("Warning: Hyrax did not respond yet, testing anyway.")
+
+    for granule_filename in granule_filenames:
+        if granule_filename in failed:
+            print(f"Skipping DMR++ tests for {granule_filename} because its sidecar was not generated.")
+            continue
+        try:
+            test_dmrpp(granule_filename)
         except Exception as e:
-            print(f"  An unexpected error occurred during {name} check: {e}")
+            print(f"Failed to test DMR++ for {granule_filename}: {e}")
 
 #---- MAIN SCRIPT ----#
 def main():
@@ -239,110 +606,116 @@ def main():
                         help=f"The DOI for the Earthdata collection (default: {COLLECTION_DOI})")
     parser.add_argument("-s", "--data-dir", type=str, default=DATA_DIR,
                         help=f"The local directory to store downloaded HDF files (default: {DATA_DIR})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Always query CMR for the collection concept ID, ignoring {CONCEPT_ID_CACHE}")
+    parser.add_argument("-v", "--verbose", help="increase output verbosity", action="store_true", default=False)
     args = parser.parse_args()
 
+    global verbose
+    verbose = args.verbose
+
     collection_doi = args.doi
     data_dir = args.data_dir
 
-    print("\n\t/***************************************/"
-          "\n\t/*** Starting granule testing script ***/"
-          "\n\t/***************************************/")
+    # Phase markers are single-line log records so they are easy to grep in CI output
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout)
+    logging.info("phase=start doi=%s data_dir=%s", collection_doi, data_dir)
+
+    # Resolve CMR in the background while the rest of the setup runs
+    threading.Thread(target=warm_dns, args=(CMR_HOST,), daemon=True).start()
 
     # 1. Setup local data directory
     os.makedirs(data_dir, exist_ok=True)
     print(f"Ensured local data directory exists: {data_dir}")
 
     # Get the collection concept ID first using the DOI
-    collection_concept_id = get_collection_concept_id(collection_doi)
+    collection_concept_id = get_collection_concept_id(collection_doi, use_cache=not args.no_cache)
     if not collection_concept_id:
         print("Could not retrieve collection concept ID. Exiting.")
         return
 
     # 2. Docker setup
-    print("\n\t|-----------------------------------------|"
-          "\n\t|--- Setting up Hyrax Docker Container ---|"
-          "\n\t|-----------------------------------------|")
+    logging.info("phase=docker_setup container=%s image=%s", HYRAX_CONTAINER_NAME, HYRAX_IMAGE)
     try:
         # Remove existing container
-        run_command(["docker", "rm", "-f", HYRAX_CONTAINER_NAME], check_success=False)
+        remove_hyrax_container()
 
         # Run new Hyrax container
-        docker_run_cmd = [
-            "docker", "run", "-d",
-            "-h", HYRAX_CONTAINER_NAME,
-            "-p", f"{HYRAX_PORT}:8080",
-            "-v", f"{data_dir}:/usr/share/hyrax", # Mount local data dir to container's /usr/share/hyrax
-            "--name", HYRAX_CONTAINER_NAME,
-            HYRAX_IMAGE
-        ]
-        run_command(docker_run_cmd)
-        print("Hyrax container should be ready.")
+        start_hyrax_container(data_dir)
     except Exception as e:
         print(f"Failed to setup Docker container: {e}")
+        remove_hyrax_container()
         return
 
-    granules_to_test = []
-
-    # 3. Get first granule info using the collection concept ID
-    first_granule = get_granule_info(collection_concept_id, "start_date")
-    if first_granule:
-        granules_to_test.append(first_granule)
-
-    # 4. Get last granule info using the collection concept ID
-    last_granule = get_granule_info(collection_concept_id, "-start_date")
-    if last_granule and (not first_granule or first_granule["granule_id"] != last_granule["granule_id"]):
-        # Only add last granule if it's different from the first
-        granules_to_test.append(last_granule)
-
-    if not granules_to_test:
-        print("No granules found to test. Exiting.")
-        # Attempt to clean up docker. We can remove this if we want to leave docker running
-        print("\n--- Attempting Docker Cleanup ---")
-        run_command(["docker", "rm", "-f", HYRAX_CONTAINER_NAME], check_success=False)
-        return
-
-    # 5. Loop through granules and test
-    for granule_info in granules_to_test:
-        download_url = granule_info["download_url"]
-        parsed_url = urlparse(download_url)
-        granule_filename = os.path.basename(parsed_url.path)
-        local_hdf_path = os.path.join(data_dir, granule_filename)
-
-        if not download_file(download_url, local_hdf_path):
-            print(f"Skipping processing for {granule_filename} due to download failure.")
-            continue
-
-        print("\n\t|--------------------------------------------------------------------------------------|"
-              f"\n\t|--- Running gen_dmrpp_side_car for {granule_filename} ---|"
-              "\n\t|--------------------------------------------------------------------------------------|")
-        # Ensure the filename passed to docker exec is relative to /usr/share/hyrax
-        # which is the mounted directory.
-        dmrpp_command = [
-            "docker", "exec", "-it",
-            "-w", "/usr/share/hyrax", # Working directory inside the container
-            HYRAX_CONTAINER_NAME,
-            "gen_dmrpp_side_car",
-            "-i", granule_filename, # Filename relative to /usr/share/hyrax
-            "-H", "-U"
-        ]
-        try:
-            run_command(dmrpp_command)
-            print(f"Successfully ran gen_dmrpp_side_car for {granule_filename}.")
-            test_dmrpp(granule_filename)
-        except Exception as e:
-            print(f"Failed to generate DMR++ sidecar or test for {granule_filename}: {e}")
+    # From here on the container is running; always remove it, even if the run is
+    # interrupted or a worker fails. We can remove this if we want to leave docker running.
+    try:
+        # Let Hyrax start up while CMR is queried and the granules download; only the
+        # DMR++ probes need it, and process_granules() waits on this before probing.
+        hyrax_waiter = ThreadPoolExecutor(max_workers=1)
+        hyrax_ready = hyrax_waiter.submit(wait_for_hyrax)
+        hyrax_waiter.shutdown(wait=False)
+
+        granules_to_test = []
+
+        # 3. & 4. Get the first and last granule info using the collection concept ID.
+        # The two CMR queries are independent, so run them at the same time.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first_future = executor.submit(get_granule_info, collection_concept_id, "start_date")
+            last_future = executor.submit(get_granule_info, collection_concept_id, "-start_date")
+            first_granule, last_granule = first_future.result(), last_future.result()
+
+        if first_granule:
+            granules_to_test.append(first_granule)
+
+        if last_granule and (not first_granule or first_granule["granule_id"] != last_granule["granule_id"]):
+            # Only add last granule if it's different from the first
+            granules_to_test.append(last_granule)
+
+        if not granules_to_test:
+            print("No granules found to test. Exiting.")
+            return
+
+        # 5. Download the granules and test them as a two-stage pipeline: while
+        # gen_dmrpp_side_car and the Hyrax probes run for one granule, the next
+        # granule is already downloading.
+        with ThreadPoolExecutor(max_workers=1) as downloader, ThreadPoolExecutor(max_workers=1) as processor:
+            downloads = []
+            for granule_info in granules_to_test:
+                download_url = granule_info["download_url"]
+                granule_filename = granule_filename_from_url(download_url)
+                local_hdf_path = os.path.join(data_dir, granule_filename)
+                downloads.append((granule_filename, downloader.submit(download_file, download_url, local_hdf_path)))
+
+            # Wait for the next download, then also take any later downloads that have already
+            # finished, and hand that batch to the processor as one gen_dmrpp_side_car run.
+            batches = []
+            i = 0
+            while i < len(downloads):
+                batch = []
+                while i < len(downloads) and (not batch or downloads[i][1].done()):
+                    granule_filename, download = downloads[i]
+                    i += 1
+                    if download.result():
+                        batch.append(granule_filename)
+                    else:
+                        print(f"Skipping processing for {granule_filename} due to download failure.")
+                if batch:
+                    batches.append(processor.submit(process_granules, batch, hyrax_ready))
+
+            # Surface anything that escaped process_granules() rather than losing it
+            for batch_future in batches:
+                batch_future.result()
+    finally:
+        # 6. Clean up
+        logging.info("phase=cleanup container=%s", HYRAX_CONTAINER_NAME)
+        remove_hyrax_container()
 
-    # 6. Clean up
-    print("\n\n--- Cleaning up Docker Container ---")
-    run_command(["docker", "rm", "-f", HYRAX_CONTAINER_NAME], check_success=False)
     # Optionally, you can remove the downloaded data:
-    # import shutil
     # shutil.rmtree(data_dir)
     # print(f"Removed local data directory: {data_dir}")
 
-    print("\n\t|--------------------------|"
-          "\n\t|Granule testing, complete.|"
-          "\n\t|--------------------------|\n")
+    logging.info("phase=complete")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,323 @@
+"""
+Test functions in the pydmr test_granules script.
+"""
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import responses
+
+import test_granules
+
+
+class TestGranules(unittest.TestCase):
+    DATA = "http://esip.opendap.org/ns/esip/data"
+    DOWNLOAD = "http://esip.opendap.org/ns/esip/download"
+    OTHER = "http://esip.opendap.org/ns/esip/browse"
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        cache_file = pathlib.Path(self.tmp_dir.name) / "cache" / "doi_concept.json"
+        patcher = mock.patch.object(test_granules, "CONCEPT_ID_CACHE", cache_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_quietly(self, function, *args, **kwargs):
+        """Call 'function', discarding what it prints."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function(*args, **kwargs)
+
+    def test_run_command_capture_output(self):
+        command = [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"]
+        result = self.run_quietly(test_granules.run_command, command, capture_output=True)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "out\n")
+        self.assertEqual(result.stderr, "err\n")
+
+    def test_run_command_capture_output_echoes_stderr(self):
+        command = [sys.executable, "-c", "import sys; print('err', file=sys.stderr)"]
+        printed_errors = io.StringIO()
+        with contextlib.redirect_stderr(printed_errors):
+            self.run_quietly(test_granules.run_command, command, capture_output=True)
+        self.assertEqual(printed_errors.getvalue(), "err\n")
+
+    def test_run_command_capture_output_failure(self):
+        command = [sys.executable, "-c", "print('only once'); raise SystemExit(3)"]
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                test_granules.run_command(command, capture_output=True)
+        self.assertEqual(cm.exception.returncode, 3)
+        self.assertEqual(cm.exception.stdout, "only once\n")
+        # The output is echoed while the command runs and not printed again on failure
+        self.assertEqual(printed.getvalue().count("only once"), 1)
+
+    def test_run_command_capture_output_no_check(self):
+        command = [sys.executable, "-c", "raise SystemExit(2)"]
+        result = self.run_quietly(test_granules.run_command, command, check_success=False, capture_output=True)
+        self.assertEqual(result.returncode, 2)
+
+    def test_process_granules_skips_failed_sidecars(self):
+        output = f"{test_granules.SIDECAR_FAILED_MARKER} bad file.hdf\n"
+        error = subprocess.CalledProcessError(1, ["sh"], output)
+        with mock.patch.object(test_granules, "exec_in_hyrax", side_effect=error), \
+                mock.patch.object(test_granules, "test_dmrpp") as test_dmrpp:
+            self.run_quietly(test_granules.process_granules, ["a.hdf", "bad file.hdf", "c.hdf"])
+        self.assertEqual([c[0][0] for c in test_dmrpp.call_args_list], ["a.hdf", "c.hdf"])
+
+    def test_process_granules_marker_after_unterminated_output(self):
+        # Run the generated script with a local stand-in for gen_dmrpp_side_car that fails for
+        # one file and, like some tools, does not end its output with a newline.
+        bin_dir = os.path.join(self.tmp_dir.name, "bin")
+        os.mkdir(bin_dir)
+        tool = os.path.join(bin_dir, "gen_dmrpp_side_car")
+        with open(tool, "w") as f:
+            f.write('#!/bin/sh\nprintf "no newline"\n[ "$2" != "bad file.hdf" ]\n')
+        os.chmod(tool, 0o755)
+
+        def run_locally(command):
+            result = subprocess.run(command, capture_output=True, text=True,
+                                    env=dict(os.environ, PATH=bin_dir + os.pathsep + os.environ["PATH"]))
+            if result.returncode != 0:
+                raise subprocess.CalledProcessError(result.returncode, command, result.stdout)
+            return result.stdout
+
+        with mock.patch.object(test_granules, "exec_in_hyrax", side_effect=run_locally), \
+                mock.patch.object(test_granules, "test_dmrpp") as test_dmrpp:
+            self.run_quietly(test_granules.process_granules, ["a.hdf", "bad file.hdf", "c.hdf"])
+        self.assertEqual([c[0][0] for c in test_dmrpp.call_args_list], ["a.hdf", "c.hdf"])
+
+    def test_process_granules_all_fail_without_report(self):
+        with mock.patch.object(test_granules, "exec_in_hyrax", side_effect=FileNotFoundError("docker")), \
+                mock.patch.object(test_granules, "test_dmrpp") as test_dmrpp:
+            self.run_quietly(test_granules.process_granules, ["a.hdf", "c.hdf"])
+        test_dmrpp.assert_not_called()
+
+    def test_process_granules_success(self):
+        with mock.patch.object(test_granules, "exec_in_hyrax", return_value=""), \
+                mock.patch.object(test_granules, "test_dmrpp") as test_dmrpp:
+            self.run_quietly(test_granules.process_granules, ["a.hdf", "c.hdf"])
+        self.assertEqual([c[0][0] for c in test_dmrpp.call_args_list], ["a.hdf", "c.hdf"])
+
+    def test_process_granules_waits_for_hyrax_before_probing(self):
+        hyrax_ready = concurrent.futures.Future()
+        events = []
+        timer = threading.Timer(0.1, lambda: (events.append("ready"), hyrax_ready.set_result(True)))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        with mock.patch.object(test_granules, "exec_in_hyrax", return_value=""), \
+                mock.patch.object(test_granules, "test_dmrpp", side_effect=events.append):
+            self.run_quietly(test_granules.process_granules, ["a.hdf"], hyrax_ready)
+        self.assertEqual(events, ["ready", "a.hdf"])
+
+    def test_main_surfaces_worker_error_and_cleans_up(self):
+        granule = {"granule_id": "G1-TEST", "download_url": "https://a/f.hdf"}
+        argv = ["test_granules.py", "-s", self.tmp_dir.name, "--no-cache"]
+        with mock.patch.object(sys, "argv", argv), \
+                mock.patch.object(test_granules, "get_collection_concept_id", return_value="C1-TEST"), \
+                mock.patch.object(test_granules, "start_hyrax_container"), \
+                mock.patch.object(test_granules, "remove_hyrax_container") as remove_hyrax_container, \
+                mock.patch.object(test_granules, "wait_for_hyrax", return_value=True), \
+                mock.patch.object(test_granules, "get_granule_info", return_value=granule), \
+                mock.patch.object(test_granules, "download_file", return_value=True), \
+                mock.patch.object(test_granules, "process_granules", side_effect=RuntimeError("boom")), \
+                mock.patch.object(test_granules.logging, "info") as log_info:
+            with self.assertRaises(RuntimeError):
+                self.run_quietly(test_granules.main)
+        # Once before starting the container and once, in the finally block, after the failure
+        self.assertEqual(remove_hyrax_container.call_count, 2)
+        self.assertNotIn(mock.call("phase=complete"), log_info.call_args_list)
+
+    # get_granule_info() link ranking
+
+    def granule_url_for(self, links):
+        """Run get_granule_info() against a mocked CMR reply holding 'links'; return the chosen URL."""
+        responses.add(responses.GET, test_granules.CMR_GRANULES_URL,
+                      json={"feed": {"entry": [{"title": "T", "id": "G1-TEST", "links": links}]}}, status=200)
+        info = self.run_quietly(test_granules.get_granule_info, "C1-TEST", "start_date")
+        return info["download_url"] if info else None
+
+    @responses.activate
+    def test_granule_first_https_priority_link_wins(self):
+        links = [{"href": "http://a/http_priority.hdf", "rel": self.DATA},
+                 {"href": "https://a/https_other.hdf", "rel": self.OTHER},
+                 {"href": "https://a/first_priority.hdf", "rel": self.DATA},
+                 {"href": "https://a/second_priority.hdf", "rel": self.DOWNLOAD}]
+        self.assertEqual(self.granule_url_for(links), "https://a/first_priority.hdf")
+
+    @responses.activate
+    def test_granule_https_preferred_over_http_priority(self):
+        links = [{"href": "http://a/http_priority.hdf", "rel": self.DATA},
+                 {"href": "https://a/https_other.hdf", "rel": self.OTHER}]
+        self.assertEqual(self.granule_url_for(links), "https://a/https_other.hdf")
+
+    @responses.activate
+    def test_granule_http_priority_preferred_over_http_other(self):
+        links = [{"href": "http://a/http_other.hdf", "rel": self.OTHER},
+                 {"href": "http://a/http_priority.hdf", "rel": self.DATA}]
+        self.assertEqual(self.granule_url_for(links), "http://a/http_priority.hdf")
+
+    @responses.activate
+    def test_granule_scheme_and_suffix_case_insensitive(self):
+        links = [{"href": "HTTPS://a/upper.HDF", "rel": self.DATA}]
+        self.assertEqual(self.granule_url_for(links), "HTTPS://a/upper.HDF")
+
+    @responses.activate
+    def test_granule_hdf_with_query_or_fragment(self):
+        self.assertEqual(self.granule_url_for([{"href": "https://a/q.hdf?token=x", "rel": self.DATA}]),
+                         "https://a/q.hdf?token=x")
+        responses.reset()
+        self.assertEqual(self.granule_url_for([{"href": "https://a/f.hdf#part", "rel": self.DATA}]),
+                         "https://a/f.hdf#part")
+
+    @responses.activate
+    def test_granule_no_suitable_link(self):
+        links = [{"href": "s3://bucket/a.hdf", "rel": self.DATA},
+                 {"href": "https://a/a.hdf.xml", "rel": self.DATA},
+                 {"href": "https://a/a.nc", "rel": self.DATA}]
+        self.assertIsNone(self.granule_url_for(links))
+
+    def test_granule_filename_from_url(self):
+        self.assertEqual(test_granules.granule_filename_from_url("https://a/b/f.hdf"), "f.hdf")
+        self.assertEqual(test_granules.granule_filename_from_url("https://a/b/f.hdf?token=1"), "f.hdf")
+        self.assertEqual(test_granules.granule_filename_from_url("https://a/b/f.hdf?redirect=https://x/y"), "f.hdf")
+        self.assertEqual(test_granules.granule_filename_from_url("https://a/b/f.hdf#p/q"), "f.hdf")
+        self.assertEqual(test_granules.granule_filename_from_url("https://a/b/f.hdf?r=/x#p/q"), "f.hdf")
+
+    # download_file() skip and resume
+
+    def local_file(self, content):
+        path = os.path.join(self.tmp_dir.name, "granule.hdf")
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    @responses.activate
+    def test_download_skipped_when_complete(self):
+        path = self.local_file(b"abcdef")
+        responses.add(responses.HEAD, "https://a/granule.hdf", headers={"Content-Length": "6"})
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        self.assertEqual(len(responses.calls), 1)  # Only the HEAD request
+
+    @responses.activate
+    def test_download_resumed_with_206(self):
+        path = self.local_file(b"abc")
+        responses.add(responses.HEAD, "https://a/granule.hdf", headers={"Content-Length": "6", "ETag": '"v1"'})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"def", status=206,
+                      headers={"Content-Range": "bytes 3-5/6"})
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        self.assertEqual(responses.calls[1].request.headers["Range"], "bytes=3-")
+        self.assertEqual(responses.calls[1].request.headers["If-Range"], '"v1"')
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"abcdef")
+
+    @responses.activate
+    def test_download_if_range_uses_last_modified_for_weak_etag(self):
+        path = self.local_file(b"abc")
+        last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+        responses.add(responses.HEAD, "https://a/granule.hdf",
+                      headers={"Content-Length": "6", "ETag": 'W/"v1"', "Last-Modified": last_modified})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"def", status=206,
+                      headers={"Content-Range": "bytes 3-5/6"})
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        self.assertEqual(responses.calls[1].request.headers["If-Range"], last_modified)
+
+    @responses.activate
+    def test_download_not_resumed_without_validator(self):
+        path = self.local_file(b"abc")
+        responses.add(responses.HEAD, "https://a/granule.hdf", headers={"Content-Length": "6"})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"ABCDEF", status=200)
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        self.assertNotIn("Range", responses.calls[1].request.headers)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"ABCDEF")
+
+    @responses.activate
+    def test_download_restarted_on_mismatched_content_range(self):
+        path = self.local_file(b"abc")
+        responses.add(responses.HEAD, "https://a/granule.hdf", headers={"Content-Length": "6", "ETag": '"v1"'})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"CDEF", status=206,
+                      headers={"Content-Range": "bytes 2-5/6"})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"ABCDEF", status=200)
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        self.assertEqual(len(responses.calls), 3)
+        self.assertNotIn("Range", responses.calls[2].request.headers)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"ABCDEF")
+
+    @responses.activate
+    def test_download_rewritten_when_range_ignored(self):
+        path = self.local_file(b"abc")
+        responses.add(responses.HEAD, "https://a/granule.hdf", headers={"Content-Length": "6", "ETag": '"v1"'})
+        responses.add(responses.GET, "https://a/granule.hdf", body=b"ABCDEF", status=200)
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/granule.hdf", path))
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"ABCDEF")
+
+    @responses.activate
+    def test_download_new_file(self):
+        path = os.path.join(self.tmp_dir.name, "new.hdf")
+        responses.add(responses.GET, "https://a/new.hdf", body=b"data", status=200)
+        self.assertTrue(self.run_quietly(test_granules.download_file, "https://a/new.hdf", path))
+        self.assertNotIn("Range", responses.calls[0].request.headers)
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"data")
+
+    # Concept ID cache
+
+    @responses.activate
+    def test_concept_id_cached_after_lookup(self):
+        responses.add(responses.GET, test_granules.CMR_COLLECTIONS_URL,
+                      json={"feed": {"entry": [{"id": "C1-TEST"}]}}, status=200)
+        self.assertEqual(self.run_quietly(test_granules.get_collection_concept_id, "10.1/x"), "C1-TEST")
+        self.assertEqual(self.run_quietly(test_granules.get_collection_concept_id, "10.1/x"), "C1-TEST")
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_concept_id_no_cache(self):
+        responses.add(responses.GET, test_granules.CMR_COLLECTIONS_URL,
+                      json={"feed": {"entry": [{"id": "C1-TEST"}]}}, status=200)
+        self.run_quietly(test_granules.get_collection_concept_id, "10.1/x", use_cache=False)
+        self.run_quietly(test_granules.get_collection_concept_id, "10.1/x", use_cache=False)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertFalse(test_granules.CONCEPT_ID_CACHE.exists())
+
+    def write_cache(self, payload):
+        test_granules.CONCEPT_ID_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        with open(test_granules.CONCEPT_ID_CACHE, "w") as f:
+            json.dump(payload, f)
+
+    def test_concept_id_cache_entries_expire_individually(self):
+        now = time.time()
+        self.write_cache({"old": {"id": "C-OLD", "time": now - test_granules.CACHE_MAX_AGE - 1},
+                          "new": {"id": "C-NEW", "time": now}})
+        self.assertEqual(test_granules.read_concept_id_cache(), {"new": {"id": "C-NEW", "time": now}})
+
+        # Adding an entry must not refresh the expired one
+        self.run_quietly(test_granules.write_concept_id_cache, "another", "C-ANOTHER")
+        self.assertEqual(sorted(test_granules.read_concept_id_cache()), ["another", "new"])
+
+    def test_concept_id_cache_malformed(self):
+        self.assertEqual(test_granules.read_concept_id_cache(), {})  # missing file
+        self.write_cache(["not", "a", "dict"])
+        self.assertEqual(test_granules.read_concept_id_cache(), {})
+        self.write_cache({"doi": "C-OLD-FORMAT"})
+        self.assertEqual(test_granules.read_concept_id_cache(), {})
+        with open(test_granules.CONCEPT_ID_CACHE, "w") as f:
+            f.write("{not json")
+        self.assertEqual(test_granules.read_concept_id_cache(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()